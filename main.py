@@ -1,7 +1,12 @@
+import logging
+
 from src.app import App
 from nicegui import ui
 
 def main():
+    # INFO keeps debug logging calls cheap no-ops outside development
+    logging.basicConfig(level=logging.INFO)
+
     # Initialize the app (builds the UI)
     App()
     
@@ -1,24 +1,59 @@
 """Finance Analyser GUI Application using NiceGUI."""
 
-import io
-from datetime import datetime
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import date
 from typing import Optional
 
-import plotly.graph_objects as go
-from nicegui import events, ui
+from nicegui import events, run, ui
 
 from src.database import init_db
+from src.models import CATEGORIES
 from src.services import (
     AnalyticsService,
-    BankStatementProcessingService,
     TransactionPipeline,
     TransactionService,
 )
 
+logger = logging.getLogger(__name__)
+
+# Transaction table layout, shared by every client
+# Amounts are formatted in the browser, so rows ship as raw numbers
+_AMOUNT_FORMAT = 'value => value == null ? "" : value.toFixed(2)'
+TRANSACTION_COLUMNS = (
+    {'name': 'id', 'label': 'ID', 'field': 'id', 'sortable': True, 'align': 'left'},
+    {'name': 'date', 'label': 'Date', 'field': 'booking_date_time', 'sortable': True, 'align': 'left'},
+    {'name': 'description', 'label': 'Description', 'field': 'description', 'sortable': True, 'align': 'left'},
+    {'name': 'originator', 'label': 'Merchant/Person', 'field': 'originator_name', 'sortable': True, 'align': 'left'},
+    {'name': 'debit', 'label': 'Debit', 'field': 'debit', 'sortable': True, 'align': 'right', ':format': _AMOUNT_FORMAT},
+    {'name': 'credit', 'label': 'Credit', 'field': 'credit', 'sortable': True, 'align': 'right', ':format': _AMOUNT_FORMAT},
+    {'name': 'category', 'label': 'Category', 'field': 'category', 'sortable': True, 'align': 'left'},
+)
+# Table column name -> Transaction field to sort by
+SORT_FIELDS = {c['name']: c['field'] for c in TRANSACTION_COLUMNS}
+
+
+@dataclass(slots=True)
+class TransactionEdit:
+    """Values submitted from the edit dialog."""
+
+    description: str
+    category: Optional[str]
+
+    def as_changes(self) -> dict:
+        """Map the edit onto the transaction columns it updates."""
+        return {'bank_statement_description': self.description, 'category': self.category}
+
 
 class App:
     """Main application frontend using NiceGUI."""
 
+    # Shared by all clients; lets two imports run side by side without
+    # tying up NiceGUI's general-purpose thread pool
+    _upload_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix='upload')
+
     def __init__(self):
         """Initialize the application."""
         init_db()
@@ -26,11 +61,23 @@ class App:
         # Initialize services
         self.transaction_service = TransactionService()
         self.analytics_service = AnalyticsService()
-        self.processing_service = BankStatementProcessingService()
         self.pipeline = TransactionPipeline()
+        self._upload_pool.submit(self.pipeline.warmup)
 
         # UI State
         self.selected_rows = []
+        self._selection_state = 'none'
+        self._importing = False
+        self._edit_dialog: Optional[ui.dialog] = None
+        self._edit_txn_id: Optional[int] = None
+        self._pie_key: Optional[tuple] = None
+        # (data version, day) the dashboard currently shows
+        self._dashboard_key: Optional[tuple[int, date]] = None
+        # (data version, row count) so paging and sorting don't recount the table
+        self._total_cache: Optional[tuple[int, int]] = None
+        # Keyset cursors by page number, valid while _cursor_key is unchanged
+        self._page_cursors: dict[int, tuple] = {}
+        self._cursor_key: Optional[tuple] = None
         
         # Build UI
         self._setup_styles()
@@ -46,20 +93,51 @@ class App:
         with ui.header().classes('items-center justify-between bg-slate-900 border-b border-slate-700'):
             ui.label('Finance Analyser').classes('text-2xl font-bold text-sky-400')
             with ui.row().classes('items-center gap-4'):
-                ui.button('Refresh All', on_click=self.refresh_all, icon='refresh').props('flat color=white')
+                ui.button('Refresh All', on_click=lambda: self.refresh_all(force=True), icon='refresh').props('flat color=white')
 
         with ui.tabs().classes('w-full bg-slate-900 text-slate-400') as tabs:
             self.import_tab = ui.tab('Import', icon='cloud_upload')
             self.transactions_tab = ui.tab('Transactions', icon='list')
             self.dashboard_tab = ui.tab('Dashboard', icon='dashboard')
 
-        with ui.tab_panels(tabs, value=self.transactions_tab).classes('w-full grow bg-transparent'):
-            with ui.tab_panel(self.import_tab):
-                self._build_import_tab()
+        # Only the initially visible panel is built now; the others on first visit
+        with ui.tab_panels(tabs, value=self.transactions_tab, on_change=self._on_tab_change).classes('w-full grow bg-transparent') as self.tab_panels:
+            import_panel = ui.tab_panel(self.import_tab)
             with ui.tab_panel(self.transactions_tab):
                 self._build_transactions_tab()
-            with ui.tab_panel(self.dashboard_tab):
-                self._build_dashboard_tab()
+            dashboard_panel = ui.tab_panel(self.dashboard_tab)
+
+        self._tab_keys = {
+            self.import_tab.props['name']: 'import',
+            self.transactions_tab.props['name']: 'transactions',
+            self.dashboard_tab.props['name']: 'dashboard',
+        }
+        self._built = {'import': False, 'transactions': True, 'dashboard': False}
+        self._lazy_panels = {
+            'import': (import_panel, self._build_import_tab),
+            'dashboard': (dashboard_panel, self._build_dashboard_tab),
+        }
+        # Views whose data changed while they were hidden; refreshed when next shown
+        self._dirty = {'transactions': False, 'dashboard': False}
+
+    def _tab_key(self, value) -> str:
+        """Map a tab (or tab name) to its key in _built and _dirty."""
+        name = value.props['name'] if isinstance(value, ui.tab) else value
+        return self._tab_keys[name]
+
+    async def _on_tab_change(self, e: events.ValueChangeEventArguments):
+        """Build a tab panel the first time it is shown, or catch it up if stale."""
+        key = self._tab_key(e.value)
+        if not self._built[key]:
+            self._built[key] = True
+            panel, build = self._lazy_panels[key]
+            with panel:
+                build()
+            # Freshly built panels load their own data
+            if key in self._dirty:
+                self._dirty[key] = False
+        elif self._dirty.get(key):
+            await self._refresh_view(key)
 
     def _build_import_tab(self):
         """Build the CSV import section."""
@@ -72,7 +150,10 @@ class App:
                     label='Upload CSV', 
                     on_upload=self._handle_upload,
                     auto_upload=True
-                ).props('accept=.csv').classes('w-full')
+                ).props('accept=.csv').classes('w-full').bind_enabled_from(self, '_importing', backward=False.__eq__)
+                with ui.row().classes('w-full items-center justify-center gap-2 mt-4').bind_visibility_from(self, '_importing'):
+                    ui.spinner(size='md')
+                    ui.label('Importing transactions...').classes('text-slate-400')
 
     def _build_transactions_tab(self):
         """Build the transactions table section."""
@@ -81,24 +162,22 @@ class App:
                 ui.label('Annotated Transactions').classes('text-2xl font-bold')
                 with ui.row().classes('gap-2'):
                     ui.button('Annotate All', on_click=self._annotate_all, color='primary').props('icon=auto_fix_high')
-                    ui.button('Edit Selected', on_click=self._edit_selected).bind_visibility_from(self, 'selected_rows', backward=lambda x: len(x) == 1)
-                    ui.button('Delete Selected', on_click=self._delete_selected, color='red').bind_visibility_from(self, 'selected_rows', backward=lambda x: len(x) > 0)
-
-            # Table configuration using ui.table - shows annotated transactions
-            columns = [
-                {'name': 'id', 'label': 'ID', 'field': 'id', 'sortable': True, 'align': 'left'},
-                {'name': 'date', 'label': 'Date', 'field': 'booking_date_time', 'sortable': True, 'align': 'left'},
-                {'name': 'description', 'label': 'Description', 'field': 'description', 'sortable': True, 'align': 'left'},
-                {'name': 'originator', 'label': 'Merchant/Person', 'field': 'originator_name', 'sortable': True, 'align': 'left'},
-                {'name': 'debit', 'label': 'Debit', 'field': 'debit', 'sortable': True, 'align': 'right'},
-                {'name': 'credit', 'label': 'Credit', 'field': 'credit', 'sortable': True, 'align': 'right'},
-                {'name': 'category', 'label': 'Category', 'field': 'category', 'sortable': True, 'align': 'left'},
-            ]
-            
-            self.table = ui.table(columns=columns, rows=[], row_key='id', selection='multiple', pagination=20).classes('w-full')
-            self.table.on('selection', lambda e: setattr(self, 'selected_rows', e.args[1]))
+                    ui.button('Edit Selected', on_click=self._edit_selected).bind_visibility_from(self, '_selection_state', backward='one'.__eq__)
+                    ui.button('Delete Selected', on_click=self._delete_selected, color='red').bind_visibility_from(self, '_selection_state', backward='none'.__ne__)
+
+            # Server-side pagination: only the visible page is fetched and sent to the browser
+            self.table = ui.table(
+                columns=list(TRANSACTION_COLUMNS), rows=[], row_key='id', selection='multiple',
+                pagination={'rowsPerPage': 20, 'sortBy': 'date', 'descending': True, 'page': 1, 'rowsNumber': 0},
+            ).props(
+                ':rows-per-page-options="[10, 20, 50, 100]" '
+                # Only rows inside the scroll viewport are rendered, which keeps large pages cheap
+                'virtual-scroll :virtual-scroll-item-size="48" :virtual-scroll-sticky-size-start="48"'
+            ).classes('w-full').style('max-height: 70vh')
+            self.table.on('selection', lambda e: self._set_selection(e.args[1]))
+            self.table.on('request', self._on_table_request)
             
-            self._load_transactions()
+            ui.timer(0, self._load_transactions, once=True)
 
     def _build_dashboard_tab(self):
         """Build the analytics dashboard."""
@@ -116,9 +195,21 @@ class App:
             with ui.row().classes('w-full gap-4'):
                 with ui.card().classes('grow p-4 bg-slate-800 border-slate-700'):
                     ui.label('Expenditure by Category').classes('text-lg font-bold mb-4')
-                    self.pie_chart = ui.plotly({}).classes('w-full h-80')
-
-            self._update_analytics()
+                    # Built once; later updates only swap the trace's labels and values
+                    # (a raw dict skips plotly's graph_objects validation entirely)
+                    self._pie_fig = {
+                        'data': [{'type': 'pie', 'labels': [], 'values': [], 'hole': 0.4}],
+                        'layout': {
+                            'margin': {'t': 0, 'b': 0, 'l': 0, 'r': 0},
+                            'paper_bgcolor': 'rgba(0,0,0,0)',
+                            'plot_bgcolor': 'rgba(0,0,0,0)',
+                            'font': {'color': '#f8fafc'},
+                            'showlegend': True,
+                        },
+                    }
+                    self.pie_chart = ui.plotly(self._pie_fig).classes('w-full h-80')
+
+            ui.timer(0, self._update_analytics, once=True)
 
     def _stat_card(self, title: str, value: str, color: str):
         with ui.card().classes(f'grow p-6 bg-slate-800 border border-slate-700 items-center justify-center') as card:
@@ -130,37 +221,89 @@ class App:
     async def _handle_upload(self, e: events.UploadEventArguments):
         """Process uploaded CSV."""
         try:
-            # NiceGUI 3.5.0 uses e.file with async read() method
-            file_content = await e.file.read()
-            content = file_content.decode('utf-8')
             import tempfile
             import os
-            with tempfile.NamedTemporaryFile(mode='w', suffix='.csv', delete=False, encoding='utf-8') as tmp:
-                tmp.write(content)
+            # Prefer tmpfs: the file is deleted right after import, so it never needs to hit disk
+            tmp_dir = '/dev/shm' if os.path.isdir('/dev/shm') and os.access('/dev/shm', os.W_OK) else None
+            with tempfile.NamedTemporaryFile(suffix='.csv', delete=False, dir=tmp_dir) as tmp:
                 tmp_path = tmp.name
-            
+
+            self._importing = True
             try:
-                result = self.pipeline.process(tmp_path, annotate=False)
+                # NiceGUI 3.5.0 streams e.file to disk in 1 MB chunks, so the
+                # statement is never held in memory as a whole
+                await e.file.save(tmp_path)
+                # Parse and insert off the event loop so the UI stays responsive
+                result = await asyncio.wrap_future(
+                    self._upload_pool.submit(self.pipeline.process, tmp_path, annotate=False)
+                )
                 ui.notify(f"Successfully imported {result['inserted']} new transactions!", type='positive')
-                self.refresh_all()
+                await self.refresh_all()
             finally:
+                self._importing = False
                 if os.path.exists(tmp_path):
                     os.remove(tmp_path)
         except Exception as ex:
             ui.notify(f"Import failed: {ex}", type='negative')
 
-    def _load_transactions(self):
-        """Fetch only annotated transactions and update table."""
-        result = self.transaction_service.read_transactions(page_size=1000, only_annotated=True)
+    def _set_selection(self, rows: list[dict]):
+        """Store the selected rows and summarize them for the button bindings."""
+        self.selected_rows = rows
+        # Bindings poll this cheap string instead of comparing row lists
+        self._selection_state = 'one' if len(rows) == 1 else ('many' if rows else 'none')
+
+    async def _on_table_request(self, e: events.GenericEventArguments):
+        """Load the page/sort order requested by the table."""
+        await self._load_transactions(e.args['pagination'])
+
+    async def _load_transactions(self, pagination: Optional[dict] = None):
+        """Fetch a page of annotated transactions (the current one by default) and update table."""
+        pagination = pagination or self.table.pagination
+        sort_by = SORT_FIELDS.get(pagination.get('sortBy'))
+        version = self.transaction_service.data_version
+        total = None
+        if self._total_cache and self._total_cache[0] == version:
+            total = self._total_cache[1]
+        page = pagination['page']
+        descending = pagination['descending'] if sort_by else True
+
+        # Pages reached by paging forward seek from the previous page's
+        # cursor; cursors are dropped when the data or ordering changes
+        cursor_key = (version, pagination['rowsPerPage'], sort_by, descending)
+        if cursor_key != self._cursor_key:
+            self._page_cursors = {}
+            self._cursor_key = cursor_key
+
+        result = await run.io_bound(
+            self.transaction_service.read_transactions,
+            page=page,
+            page_size=pagination['rowsPerPage'],
+            sort_by=sort_by,
+            descending=descending,
+            only_annotated=True,
+            include_total=total is None,
+            after=self._page_cursors.get(page),
+            # Only the displayed columns, to keep the websocket payload small
+            projection='ui',
+        )
+        # A newer request changed the data or ordering while this one ran; its
+        # rows and cursor belong to the old order, so leave the table to it
+        if self._cursor_key != cursor_key:
+            return
+        if result['next_cursor']:
+            self._page_cursors[page + 1] = result['next_cursor']
+        if total is None:
+            total = result['total']
+            self._total_cache = (version, total)
         data = result['transactions']
-        print(f"[DEBUG] Loaded {len(data)} annotated transactions")
-        # Format dates for table
-        for d in data:
-            if isinstance(d.get('booking_date_time'), datetime):
-                d['booking_date_time'] = d['booking_date_time'].strftime('%Y-%m-%d')
-        # Update table rows
-        self.table.rows = data
-        self.table.update()
+        logger.debug("Loaded %d annotated transactions", len(data))
+        # Rows and pagination go out together in one update, and only if they
+        # changed; re-loading an unchanged page sends nothing
+        pagination = {**pagination, 'rowsNumber': total}
+        if data != self.table.rows:
+            self.table.rows = data
+        if pagination != self.table.pagination:
+            self.table.pagination = pagination
 
     async def _annotate_all(self):
         """Annotate all unannotated transactions using AI in background."""
@@ -170,42 +313,55 @@ class App:
             annotation_service = TransactionAnnotationService()
             
             # Run in background thread to prevent UI blocking
-            import asyncio
             count = await asyncio.to_thread(annotation_service.annotate_all_unannotated)
             
             ui.notify(f"Successfully annotated {count} transactions!", type='positive')
-            self.refresh_all()
+            await self.refresh_all()
         except Exception as ex:
             ui.notify(f"Annotation failed: {ex}", type='negative')
 
-    def _update_analytics(self):
+    async def _update_analytics(self):
         """Fetch stats and update visuals."""
-        income = self.analytics_service.get_total_income()
-        expense = self.analytics_service.get_total_expenditure()
-        ratio = self.analytics_service.get_income_expenditure_ratio()
-        
-        now = datetime.now()
-        forecast = self.analytics_service.get_monthly_forecast(now.year, now.month)
-
-        self.income_card.value_label.set_text(f"{income:,.2f}")
-        self.expense_card.value_label.set_text(f"{expense:,.2f}")
-        self.ratio_card.value_label.set_text(f"{ratio:.2f}")
-        self.forecast_card.value_label.set_text(f"{forecast['forecasted_total']:,.2f}")
+        if not self._built['dashboard']:
+            return
+
+        # Nothing to redraw unless transactions changed (or the day rolled over,
+        # which moves the forecast)
+        key = (self.transaction_service.data_version, date.today())
+        if key == self._dashboard_key:
+            return
+
+        # The queries run on a worker thread, not the event loop
+        stats = await run.io_bound(self.analytics_service.get_all_stats, key[0])
+        self._dashboard_key = key
+
+        self._apply_stats(stats)
+
+    def _apply_stats(self, stats: dict):
+        """Push freshly computed stats to the dashboard in one synchronous pass."""
+        # Every text is formatted first; with no awaits in between, NiceGUI
+        # sends all changed elements together in a single outbox flush
+        texts = {
+            self.income_card: f"{stats['total_income']:,.2f}",
+            self.expense_card: f"{stats['total_expenditure']:,.2f}",
+            self.ratio_card: f"{stats['ratio']:.2f}",
+            self.forecast_card: f"{stats['forecast']['forecasted_total']:,.2f}",
+        }
+        for card, text in texts.items():
+            card.value_label.set_text(text)
 
         # Update Pie Chart
-        stats = self.analytics_service.get_percentile_breakdown()
-        cats = list(stats['expenditure_by_category'].keys())
-        vals = list(stats['expenditure_by_category'].values())
+        breakdown = stats['breakdown']
+        cats = tuple(breakdown['expenditure_by_category'].keys())
+        vals = tuple(breakdown['expenditure_by_category'].values())
         
-        fig = go.Figure(data=[go.Pie(labels=cats, values=vals, hole=.4)])
-        fig.update_layout(
-            margin=dict(t=0, b=0, l=0, r=0),
-            paper_bgcolor='rgba(0,0,0,0)',
-            plot_bgcolor='rgba(0,0,0,0)',
-            font=dict(color='#f8fafc'),
-            showlegend=True
-        )
-        self.pie_chart.update_figure(fig)
+        # Skip re-sending the chart when the breakdown is unchanged
+        if (cats, vals) != self._pie_key:
+            self._pie_key = (cats, vals)
+            trace = self._pie_fig['data'][0]
+            trace['labels'] = list(cats)
+            trace['values'] = list(vals)
+            self.pie_chart.update()
 
     async def _handle_cell_change(self, e):
         """Handle inline edits in AG Grid."""
@@ -215,32 +371,52 @@ class App:
         
         self.transaction_service.update_transaction_by_id(row_id, {field: new_val})
         ui.notify(f"Updated {field} for transaction {row_id}")
-        self._update_analytics()
+        self._schedule_analytics_update()
 
-    def _edit_selected(self):
+    async def _edit_selected(self):
         """Open edit dialog for selected row."""
         if not self.selected_rows: return
-        txn = self.selected_rows[0]
-        
-        with ui.dialog() as dialog, ui.card().classes('w-96'):
+        # Table rows only carry the displayed columns; load the full transaction
+        txn = await run.io_bound(self.transaction_service.get_transaction, self.selected_rows[0]['id'])
+        if txn is None: return
+
+        if self._edit_dialog is None:
+            self._build_edit_dialog()
+        self._edit_txn_id = txn['id']
+        self._edit_desc.value = txn['bank_statement_description']
+        self._edit_cat.value = txn['category']
+        self._edit_dialog.open()
+
+    def _build_edit_dialog(self):
+        """Build the edit dialog once; later edits just refill its fields."""
+        with self.table.parent_slot, ui.dialog() as self._edit_dialog, ui.card().classes('w-96'):
             ui.label('Edit Transaction').classes('text-xl font-bold mb-4')
-            desc = ui.input('Description', value=txn['bank_statement_description']).classes('w-full')
-            cat = ui.select(['Food', 'Transport', 'Shopping', 'Bills', 'Transfer', 'Salary', 'Entertainment', 'ATM', 'Subscription', 'Government', 'Other'], 
-                           label='Category', value=txn['category']).classes('w-full')
-            
-            with ui.row().classes('w-full justify-end mt-4'):
-                ui.button('Cancel', on_click=dialog.close).props('flat')
-                ui.button('Save', on_click=lambda: self._save_edit(txn['id'], desc.value, cat.value, dialog))
-        dialog.open()
+            self._edit_desc = ui.input('Description').classes('w-full')
+            self._edit_cat = ui.select(list(CATEGORIES), label='Category').classes('w-full')
 
-    def _save_edit(self, txn_id, desc, cat, dialog):
-        self.transaction_service.update_transaction_by_id(txn_id, {
-            'bank_statement_description': desc,
-            'category': cat
-        })
+            with ui.row().classes('w-full justify-end mt-4'):
+                ui.button('Cancel', on_click=self._edit_dialog.close).props('flat')
+                ui.button('Save', on_click=lambda: self._save_edit(
+                    self._edit_txn_id, TransactionEdit(self._edit_desc.value, self._edit_cat.value), self._edit_dialog))
+
+    def _save_edit(self, txn_id: int, edit: TransactionEdit, dialog):
+        changes = edit.as_changes()
+        # Rows only hold the displayed columns, so only those are patched
+        shown = {k: v for k, v in changes.items() if k in TransactionService.UI_FIELDS}
+        self.transaction_service.update_transaction_by_id(txn_id, changes)
         dialog.close()
         ui.notify('Transaction updated')
-        self.refresh_all()
+        # Patch only the edited row; the rest of the page is untouched and
+        # the table is not re-fetched
+        row = next((r for r in self.table.rows if r['id'] == txn_id), None)
+        if row is not None:
+            row.update(shown)
+            self.table.update()
+        # The selection holds its own copies of the rows, keep them in sync too
+        for selected in self.selected_rows:
+            if selected['id'] == txn_id:
+                selected.update(shown)
+        self._schedule_analytics_update()
 
     async def _delete_selected(self):
         """Delete all selected rows."""
@@ -253,17 +429,47 @@ class App:
         dialog.open()
 
     def _perform_delete(self, dialog):
-        for row in self.selected_rows:
-            self.transaction_service.delete_transaction(row['id'])
+        deleted_ids = {row['id'] for row in self.selected_rows}
+        self.transaction_service.delete_transactions_bulk(list(deleted_ids))
         dialog.close()
-        self.selected_rows = []
+        self._set_selection([])
         ui.notify(f'Deleted transactions')
-        self.refresh_all()
-
-    def refresh_all(self):
-        """Refresh all data views."""
-        self._load_transactions()
-        self._update_analytics()
+        # Drop the rows locally instead of reloading the page
+        self.table.rows = [r for r in self.table.rows if r['id'] not in deleted_ids]
+        self.table.pagination = {
+            **self.table.pagination,
+            'rowsNumber': max(self.table.pagination['rowsNumber'] - len(deleted_ids), 0),
+        }
+        self._schedule_analytics_update()
+
+    def _schedule_analytics_update(self):
+        """Mark the dashboard stale after an edit; it recomputes once, when next shown."""
+        # Edits are made from the Transactions tab, so the dashboard is never
+        # visible here and any number of edits collapse into one recompute
+        self._dirty['dashboard'] = True
+
+    async def _refresh_view(self, key: str):
+        """Reload the data shown in one tab."""
+        self._dirty[key] = False
+        if key == 'transactions':
+            await self._load_transactions()
+        elif key == 'dashboard':
+            await self._update_analytics()
+
+    async def refresh_all(self, force: bool = False):
+        """Refresh the visible data view; hidden ones refresh when next shown.
+
+        force discards the data-version caches (row count, page cursors,
+        dashboard stats), picking up rows written by another process.
+        """
+        if force:
+            self.transaction_service.mark_changed()
+        current = self._tab_key(self.tab_panels.value)
+        for key in self._dirty:
+            if key == current:
+                await self._refresh_view(key)
+            else:
+                self._dirty[key] = True
 
 # The UI is built during initialization of the App class.
 # NiceGUI elements are global, so we just need to instantiate the class.
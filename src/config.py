@@ -1,5 +1,6 @@
 """Application configuration using pydantic-settings."""
 
+from functools import cached_property, lru_cache
 from pathlib import Path
 from typing import Optional
 
@@ -13,6 +14,7 @@ class Settings(BaseSettings):
         env_file=".env",
         env_file_encoding="utf-8",
         extra="ignore",
+        frozen=True,
     )
 
     # Database
@@ -24,10 +26,16 @@ class Settings(BaseSettings):
     # Pagination
     default_page_size: int = 20
 
-    @property
+    @cached_property
     def database_url(self) -> str:
         """Get SQLite connection URL."""
         return f"sqlite:///{self.database_path}"
 
 
-settings = Settings()
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Get the application settings, loaded from the environment once."""
+    return Settings()
+
+
+settings = get_settings()
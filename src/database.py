@@ -1,24 +1,110 @@
 """Database configuration and session management."""
 
+from sqlalchemy import event
+from sqlalchemy.orm import scoped_session, sessionmaker
+from sqlalchemy.pool import QueuePool
 from sqlmodel import Session, SQLModel, create_engine
 
 from src.config import settings
 
-# Create engine with SQLite
+# Create engine with SQLite. Connections stay open in the pool, so the PRAGMA
+# hook below runs once per connection rather than per query; a single shared
+# connection (StaticPool) is not an option because UI, upload and worker
+# threads query concurrently.
 engine = create_engine(
     settings.database_url,
     echo=False,
     connect_args={"check_same_thread": False},
+    poolclass=QueuePool,
+    pool_size=10,
 )
 
+# One session per thread, reused across service calls; leaving a `with` block
+# closes it, which only hands its connection back to the pool
+SessionLocal = scoped_session(
+    sessionmaker(bind=engine, class_=Session, expire_on_commit=False)
+)
+
+_initialized = False
+
+# Indexes earlier versions created that the current ones make redundant
+_OBSOLETE_INDEXES = (
+    "ix_transactions_booking_order",
+    "ix_transactions_booking_date_time",
+    "ix_transactions_stan_id",
+)
+
+
+@event.listens_for(engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    """Tune every new SQLite connection for the app's read-heavy, edit-then-refresh use."""
+    cursor = dbapi_connection.cursor()
+    # WAL lets the UI keep reading while an import or edit is writing
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA mmap_size=268435456")
+    cursor.execute("PRAGMA cache_size=-64000")
+    cursor.close()
+
 
 def init_db() -> None:
-    """Initialize database tables."""
+    """Initialize database tables (only the first call does any work)."""
+    global _initialized
+    if _initialized:
+        return
+
     # Import models to register them with SQLModel
-    from src.models import Transaction  # noqa: F401
+    from src.models import AnnotationCache, Transaction  # noqa: F401
+    with engine.connect() as connection:
+        indexes_before = _index_names(connection)
     SQLModel.metadata.create_all(engine)
+    # create_all skips existing tables, so add indexes introduced since they were made
+    for index in Transaction.__table__.indexes:
+        index.create(engine, checkfirst=True)
+    with engine.begin() as connection:
+        # ...and drop ones they replaced, so imports don't maintain them
+        for name in _OBSOLETE_INDEXES:
+            connection.exec_driver_sql(f"DROP INDEX IF EXISTS {name}")
+        # Planner statistics stop SQLite preferring low-selectivity indexes (like
+        # is_taxes) over the booking index used for paging. ANALYZE reads every
+        # index, so it only runs when the indexes or the table size have changed
+        if _index_names(connection) != indexes_before or _stats_stale(connection):
+            connection.exec_driver_sql("ANALYZE")
+    _initialized = True
+
+
+def _index_names(connection) -> set[str]:
+    """Get the names of all indexes in the database."""
+    return set(
+        connection.exec_driver_sql(
+            "SELECT name FROM sqlite_master WHERE type = 'index'"
+        ).scalars()
+    )
+
+
+def _stats_stale(connection) -> bool:
+    """Check whether the transactions statistics are missing or far off its size."""
+    has_stats = connection.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'"
+    ).first()
+    if not has_stats:
+        return True
+
+    stat = connection.exec_driver_sql(
+        "SELECT stat FROM sqlite_stat1 WHERE tbl = 'transactions' LIMIT 1"
+    ).scalar()
+    rows = connection.exec_driver_sql("SELECT count(*) FROM transactions").scalar()
+    if stat is None:
+        # ANALYZE records nothing for an empty table
+        return rows > 0
+
+    # The first number is the row count when the stats were gathered; re-analyze
+    # once the table has doubled or halved since
+    analyzed = int(stat.split()[0])
+    return not analyzed / 2 <= rows <= analyzed * 2
 
 
 def get_session() -> Session:
-    """Get a new database session."""
-    return Session(engine)
+    """Get the database session for the current thread."""
+    return SessionLocal()
@@ -1,5 +1,6 @@
 """Models package for the Finance Analyser."""
 
-from src.models.transaction import Transaction
+from src.models.annotation_cache import AnnotationCache
+from src.models.transaction import CATEGORIES, Transaction
 
-__all__ = ["Transaction"]
+__all__ = ["AnnotationCache", "CATEGORIES", "Transaction"]
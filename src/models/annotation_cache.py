@@ -0,0 +1,19 @@
+"""Annotation cache model for the Finance Analyser."""
+
+from typing import Optional
+
+from sqlmodel import Field, SQLModel
+
+
+class AnnotationCache(SQLModel, table=True):
+    """LLM annotation remembered for a normalized bank statement description."""
+
+    __tablename__ = "annotation_cache"
+
+    # Hash of the description with digits masked, see TransactionAnnotationService
+    desc_hash: str = Field(primary_key=True)
+
+    description: Optional[str] = Field(default=None)
+    category: Optional[str] = Field(default=None)
+    originator_name: Optional[str] = Field(default=None)
+    is_taxes: bool = Field(default=False)
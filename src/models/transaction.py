@@ -3,18 +3,48 @@
 from datetime import datetime
 from typing import Optional
 
-from sqlmodel import Field, SQLModel
+from sqlmodel import Field, Index, SQLModel
+
+# Categories a transaction can be annotated with, shared by the AI prompt and the UI
+CATEGORIES = (
+    "Food",
+    "Transport",
+    "Shopping",
+    "Bills",
+    "Transfer",
+    "Salary",
+    "Entertainment",
+    "ATM",
+    "Subscription",
+    "Government",
+    "Other",
+)
 
 
 class Transaction(SQLModel, table=True):
     """Transaction model representing a bank statement entry."""
 
     __tablename__ = "transactions"
+    __table_args__ = (
+        # A statement row is identified by its booking date and position in the
+        # day. id is the rowid, so this index is also ordered like the default
+        # listing (date, day_order_id, id): paging and keyset seeks use it, as
+        # do date range filters
+        Index(
+            "ux_transactions_booking_day_order",
+            "booking_date_time",
+            "day_order_id",
+            unique=True,
+        ),
+        # Nested-tax lookup: is_taxes = 1 AND stan_id IN (...); also serves
+        # plain stan_id lookups, so stan_id has no index of its own
+        Index("ix_transactions_stan_taxes", "stan_id", "is_taxes"),
+    )
 
     id: Optional[int] = Field(default=None, primary_key=True)
 
     # Date fields
-    booking_date_time: datetime = Field(index=True)
+    booking_date_time: datetime
     value_date_time: datetime
 
     # Order tracking within a day
@@ -22,7 +52,7 @@ class Transaction(SQLModel, table=True):
 
     # Bank statement data
     bank_statement_description: str
-    stan_id: Optional[str] = Field(default=None, index=True)
+    stan_id: Optional[str] = Field(default=None)
     debit: Optional[float] = Field(default=None)
     credit: Optional[float] = Field(default=None)
     available_balance: float
@@ -1,12 +1,11 @@
 """Service for financial analytics and reporting."""
 
 import calendar
-import statistics
-from collections import defaultdict
+import math
 from datetime import datetime
 from typing import Any, Optional
 
-from sqlmodel import and_, select
+from sqlmodel import and_, case, func, select
 
 from src.database import get_session
 from src.models import Transaction
@@ -15,6 +14,54 @@ from src.models import Transaction
 class AnalyticsService:
     """Service for financial analytics and reporting."""
 
+    def __init__(self):
+        """Initialize the service."""
+        self._stats_cache: Optional[tuple[Any, dict[str, Any]]] = None
+
+    def get_all_stats(self, version: int) -> dict[str, Any]:
+        """
+        Get all dashboard metrics, cached until the data version changes.
+
+        Pass TransactionService.data_version as version.
+
+        Returns dict with 'total_income', 'total_expenditure', 'ratio', 'forecast', 'breakdown'
+        """
+        now = datetime.now()
+        # The forecast depends on today's date, so it is part of the key
+        key = (version, now.date())
+        if self._stats_cache and self._stats_cache[0] == key:
+            return self._stats_cache[1]
+
+        # A single grouped query covers totals, ratio, breakdown and this month's spend
+        month_start, month_end = self._month_bounds(now.year, now.month)
+        category = func.coalesce(Transaction.category, "Uncategorized")
+        in_month = Transaction.booking_date_time.between(month_start, month_end)
+        with get_session() as session:
+            rows = session.exec(
+                select(
+                    category,
+                    func.sum(Transaction.debit),
+                    func.sum(Transaction.credit),
+                    func.sum(case((in_month, Transaction.debit))),
+                ).group_by(category)
+            ).all()
+
+        expenditure_by_cat = {cat: debit for cat, debit, _, _ in rows if debit}
+        income_by_cat = {cat: credit for cat, _, credit, _ in rows if credit}
+        total_income = sum(income_by_cat.values())
+        total_expenditure = sum(expenditure_by_cat.values())
+        month_total = sum(month_debit for *_, month_debit in rows if month_debit)
+
+        stats = {
+            "total_income": total_income,
+            "total_expenditure": total_expenditure,
+            "ratio": self._ratio(total_income, total_expenditure),
+            "forecast": self._build_forecast(now.year, now.month, month_total),
+            "breakdown": self._build_breakdown(expenditure_by_cat, income_by_cat),
+        }
+        self._stats_cache = (key, stats)
+        return stats
+
     def get_total_expenditure(
         self,
         start_date: Optional[datetime] = None,
@@ -22,15 +69,16 @@ class AnalyticsService:
     ) -> float:
         """Get total expenditure (debits) for date range."""
         with get_session() as session:
-            query = select(Transaction).where(Transaction.debit.isnot(None))
+            query = select(func.sum(Transaction.debit)).where(
+                Transaction.debit.isnot(None)
+            )
 
             if start_date:
                 query = query.where(Transaction.booking_date_time >= start_date)
             if end_date:
                 query = query.where(Transaction.booking_date_time <= end_date)
 
-            transactions = session.exec(query).all()
-            return sum(t.debit for t in transactions if t.debit)
+            return session.exec(query).one() or 0.0
 
     def get_total_income(
         self,
@@ -39,15 +87,16 @@ class AnalyticsService:
     ) -> float:
         """Get total income (credits) for date range."""
         with get_session() as session:
-            query = select(Transaction).where(Transaction.credit.isnot(None))
+            query = select(func.sum(Transaction.credit)).where(
+                Transaction.credit.isnot(None)
+            )
 
             if start_date:
                 query = query.where(Transaction.booking_date_time >= start_date)
             if end_date:
                 query = query.where(Transaction.booking_date_time <= end_date)
 
-            transactions = session.exec(query).all()
-            return sum(t.credit for t in transactions if t.credit)
+            return session.exec(query).one() or 0.0
 
     def get_percentile_breakdown(
         self,
@@ -59,43 +108,43 @@ class AnalyticsService:
 
         Returns dict with 'expenditure_by_category' and 'income_by_category'
         """
+        category = func.coalesce(Transaction.category, "Uncategorized")
         with get_session() as session:
-            query = select(Transaction)
+            query = select(
+                category, func.sum(Transaction.debit), func.sum(Transaction.credit)
+            ).group_by(category)
             if start_date:
                 query = query.where(Transaction.booking_date_time >= start_date)
             if end_date:
                 query = query.where(Transaction.booking_date_time <= end_date)
 
-            transactions = session.exec(query).all()
-
-            # Group by category
-            expenditure_by_cat: dict[str, float] = defaultdict(float)
-            income_by_cat: dict[str, float] = defaultdict(float)
-
-            for t in transactions:
-                cat = t.category or "Uncategorized"
-                if t.debit:
-                    expenditure_by_cat[cat] += t.debit
-                if t.credit:
-                    income_by_cat[cat] += t.credit
-
-            # Calculate percentiles
-            total_exp = sum(expenditure_by_cat.values()) or 1
-            total_inc = sum(income_by_cat.values()) or 1
-
-            exp_percentiles = {
-                cat: (val / total_exp) * 100 for cat, val in expenditure_by_cat.items()
-            }
-            inc_percentiles = {
-                cat: (val / total_inc) * 100 for cat, val in income_by_cat.items()
-            }
-
-            return {
-                "expenditure_by_category": exp_percentiles,
-                "income_by_category": inc_percentiles,
-                "total_expenditure": total_exp,
-                "total_income": total_inc,
-            }
+            rows = session.exec(query).all()
+
+        expenditure_by_cat = {cat: debit for cat, debit, _ in rows if debit}
+        income_by_cat = {cat: credit for cat, _, credit in rows if credit}
+        return self._build_breakdown(expenditure_by_cat, income_by_cat)
+
+    @staticmethod
+    def _build_breakdown(
+        expenditure_by_cat: dict[str, float], income_by_cat: dict[str, float]
+    ) -> dict[str, Any]:
+        """Turn per-category totals into percentages of overall expenditure and income."""
+        total_exp = sum(expenditure_by_cat.values()) or 1
+        total_inc = sum(income_by_cat.values()) or 1
+
+        exp_percentiles = {
+            cat: (val / total_exp) * 100 for cat, val in expenditure_by_cat.items()
+        }
+        inc_percentiles = {
+            cat: (val / total_inc) * 100 for cat, val in income_by_cat.items()
+        }
+
+        return {
+            "expenditure_by_category": exp_percentiles,
+            "income_by_category": inc_percentiles,
+            "total_expenditure": total_exp,
+            "total_income": total_inc,
+        }
 
     def get_income_expenditure_ratio(
         self,
@@ -103,9 +152,25 @@ class AnalyticsService:
         end_date: Optional[datetime] = None,
     ) -> float:
         """Get income to expenditure ratio (>1 means saving, <1 means spending more)."""
-        income = self.get_total_income(start_date, end_date)
-        expenditure = self.get_total_expenditure(start_date, end_date)
+        with get_session() as session:
+            # Both totals in one scan and round trip
+            query = select(
+                func.coalesce(func.sum(Transaction.credit), 0.0),
+                func.coalesce(func.sum(Transaction.debit), 0.0),
+            )
+
+            if start_date:
+                query = query.where(Transaction.booking_date_time >= start_date)
+            if end_date:
+                query = query.where(Transaction.booking_date_time <= end_date)
+
+            income, expenditure = session.exec(query).one()
 
+        return self._ratio(income, expenditure)
+
+    @staticmethod
+    def _ratio(income: float, expenditure: float) -> float:
+        """Divide income by expenditure, treating zero expenditure specially."""
         if expenditure == 0:
             return float("inf") if income > 0 else 0.0
 
@@ -121,26 +186,43 @@ class AnalyticsService:
 
         Returns dict with 'min', 'max', 'std_dev', 'mean'
         """
-        with get_session() as session:
-            query = select(Transaction).where(Transaction.debit.isnot(None))
-
-            if start_date:
-                query = query.where(Transaction.booking_date_time >= start_date)
-            if end_date:
-                query = query.where(Transaction.booking_date_time <= end_date)
-
-            transactions = session.exec(query).all()
-            debits = [t.debit for t in transactions if t.debit]
+        debit = Transaction.debit
+        # Zero debits are not expenditures
+        conditions = [debit.isnot(None), debit != 0]
+        if start_date:
+            conditions.append(Transaction.booking_date_time >= start_date)
+        if end_date:
+            conditions.append(Transaction.booking_date_time <= end_date)
 
-            if not debits:
-                return {"min": 0.0, "max": 0.0, "std_dev": 0.0, "mean": 0.0}
-
-            return {
-                "min": min(debits),
-                "max": max(debits),
-                "std_dev": statistics.stdev(debits) if len(debits) > 1 else 0.0,
-                "mean": statistics.mean(debits),
-            }
+        with get_session() as session:
+            # SQLite has no STDDEV; squared deviations are summed around the mean
+            # (an uncorrelated subquery, evaluated once) rather than derived from
+            # the sum of squares, which cancels catastrophically when amounts
+            # are large relative to their spread
+            mean = select(func.avg(debit)).where(*conditions).scalar_subquery()
+            query = select(
+                func.count(debit),
+                func.min(debit),
+                func.max(debit),
+                func.sum(debit),
+                func.sum((debit - mean) * (debit - mean)),
+            ).where(*conditions)
+
+            count, minimum, maximum, total, squared_deviations = session.exec(query).one()
+
+        if not count:
+            return {"min": 0.0, "max": 0.0, "std_dev": 0.0, "mean": 0.0}
+
+        std_dev = 0.0
+        if count > 1:
+            std_dev = math.sqrt(squared_deviations / (count - 1))
+
+        return {
+            "min": minimum,
+            "max": maximum,
+            "std_dev": std_dev,
+            "mean": total / count,
+        }
 
     def get_monthly_forecast(self, year: int, month: int) -> dict[str, float]:
         """
@@ -148,7 +230,30 @@ class AnalyticsService:
 
         Returns dict with 'daily_mean', 'days_elapsed', 'current_total', 'forecasted_total'
         """
-        start_date = datetime(year, month, 1)
+        start_date, end_date = self._month_bounds(year, month)
+
+        with get_session() as session:
+            query = select(func.sum(Transaction.debit)).where(
+                and_(
+                    Transaction.debit.isnot(None),
+                    Transaction.booking_date_time >= start_date,
+                    Transaction.booking_date_time <= end_date,
+                )
+            )
+
+            current_total = session.exec(query).one() or 0.0
+
+        return self._build_forecast(year, month, current_total)
+
+    @staticmethod
+    def _month_bounds(year: int, month: int) -> tuple[datetime, datetime]:
+        """Get the first and last moment of a month."""
+        last_day = calendar.monthrange(year, month)[1]
+        return datetime(year, month, 1), datetime(year, month, last_day, 23, 59, 59)
+
+    @staticmethod
+    def _build_forecast(year: int, month: int, current_total: float) -> dict[str, float]:
+        """Project a month's total expenditure from what has been spent so far."""
         last_day = calendar.monthrange(year, month)[1]
         end_date = datetime(year, month, last_day, 23, 59, 59)
 
@@ -161,29 +266,17 @@ class AnalyticsService:
         else:
             days_elapsed = 0
 
-        with get_session() as session:
-            query = select(Transaction).where(
-                and_(
-                    Transaction.debit.isnot(None),
-                    Transaction.booking_date_time >= start_date,
-                    Transaction.booking_date_time <= end_date,
-                )
-            )
-
-            transactions = session.exec(query).all()
-            current_total = sum(t.debit for t in transactions if t.debit)
-
-            if days_elapsed > 0:
-                daily_mean = current_total / days_elapsed
-                forecasted_total = daily_mean * last_day
-            else:
-                daily_mean = 0.0
-                forecasted_total = 0.0
-
-            return {
-                "daily_mean": daily_mean,
-                "days_elapsed": days_elapsed,
-                "days_in_month": last_day,
-                "current_total": current_total,
-                "forecasted_total": forecasted_total,
-            }
+        if days_elapsed > 0:
+            daily_mean = current_total / days_elapsed
+            forecasted_total = daily_mean * last_day
+        else:
+            daily_mean = 0.0
+            forecasted_total = 0.0
+
+        return {
+            "daily_mean": daily_mean,
+            "days_elapsed": days_elapsed,
+            "days_in_month": last_day,
+            "current_total": current_total,
+            "forecasted_total": forecasted_total,
+        }
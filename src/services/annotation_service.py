@@ -1,20 +1,51 @@
 """Service for AI-powered transaction annotation using LangChain."""
 
-from typing import Any
-
+import hashlib
+import json
+import logging
+import re
+import threading
+from collections import defaultdict
+from typing import Any, Optional
+
+from sqlalchemy.dialects.sqlite import insert
 from sqlmodel import or_, select
 
 from src.config import settings
 from src.database import get_session
-from src.models import Transaction
+from src.models import CATEGORIES, AnnotationCache, Transaction
+
+logger = logging.getLogger(__name__)
+
+# Annotation fields an LLM reply (or cache entry) fills in on a transaction
+ANNOTATION_FIELDS = ("description", "category", "originator_name", "is_taxes")
+
+# Dates, amounts and reference numbers vary between otherwise identical charges
+_DIGITS_RE = re.compile(r"\d+")
+
+SYSTEM_PROMPT = f"""You are a financial transaction analyzer. Given a bank transaction description, extract:
+1. description: A clean, human-readable description of what this transaction is for
+2. category: One of: {', '.join(CATEGORIES)}
+3. originator_name: The merchant, person, or entity involved (if identifiable)
+4. is_taxes: true if this is a tax-related charge, false otherwise
+
+Respond in JSON format only, no other text:
+{{"description": "...", "category": "...", "originator_name": "...", "is_taxes": false}}"""
 
 
 class TransactionAnnotationService:
     """Service for AI-powered transaction annotation using LangChain."""
 
+    # Transactions loaded per query in annotate_batch
+    LOAD_CHUNK_SIZE = 500
+
+    # Chat model shared by all instances, so the heavy langchain_openai import and
+    # the client's HTTP connection pool are set up once per process
+    _llm: Optional[Any] = None
+    _llm_lock = threading.Lock()
+
     def __init__(self):
         """Initialize the annotation service."""
-        self._llm = None
         self._transaction_service = None
 
     @property
@@ -28,109 +59,209 @@ class TransactionAnnotationService:
     def _get_llm(self):
         """Lazy-load the LLM to avoid import errors if not configured."""
         if self._llm is None:
-            from langchain_openai import ChatOpenAI
-
-            if not settings.openai_api_key:
-                raise ValueError(
-                    "OpenAI API key not configured. Set OPENAI_API_KEY in .env file."
-                )
-
-            self._llm = ChatOpenAI(
-                model="gpt-4o-mini",
-                api_key=settings.openai_api_key,
-                temperature=0,
-            )
+            with TransactionAnnotationService._llm_lock:
+                # Another thread may have created it while we waited
+                if TransactionAnnotationService._llm is None:
+                    from langchain_openai import ChatOpenAI
+
+                    if not settings.openai_api_key:
+                        raise ValueError(
+                            "OpenAI API key not configured. Set OPENAI_API_KEY in .env file."
+                        )
+
+                    TransactionAnnotationService._llm = ChatOpenAI(
+                        model="gpt-4o-mini",
+                        api_key=settings.openai_api_key,
+                        temperature=0,
+                    )
         return self._llm
 
     def annotate_transaction(self, description: str) -> dict[str, Any]:
         """
         Use LLM to extract transaction metadata from description.
 
+        Descriptions seen before (ignoring digits such as dates and reference
+        numbers) are answered from the annotation cache without an LLM call.
+
         Returns dict with: description, category, originator_name, is_taxes
         """
-        from langchain_core.messages import HumanMessage, SystemMessage
-
-        llm = self._get_llm()
+        key = self._cache_key(description)
+        with get_session() as session:
+            cached = self._load_cached(session, [key])
+            if key in cached:
+                return cached[key]
 
-        system_prompt = """You are a financial transaction analyzer. Given a bank transaction description, extract:
-1. description: A clean, human-readable description of what this transaction is for
-2. category: One of: Food, Transport, Shopping, Bills, Transfer, Salary, Entertainment, ATM, Subscription, Government, Other
-3. originator_name: The merchant, person, or entity involved (if identifiable)
-4. is_taxes: true if this is a tax-related charge, false otherwise
+            response = self._get_llm().invoke(self._build_messages(description))
+            annotations = self._parse_response(response.content)
+            if annotations is None:
+                return self._fallback_annotations(description)
 
-Respond in JSON format only, no other text:
-{"description": "...", "category": "...", "originator_name": "...", "is_taxes": false}"""
+            self._store_cached(session, {key: annotations})
+            session.commit()
+        return annotations
+
+    @staticmethod
+    def _cache_key(description: str) -> str:
+        """Hash a description with digits masked, so recurring charges share a key."""
+        normalized = _DIGITS_RE.sub("#", description).strip().lower()
+        return hashlib.sha256(normalized.encode()).hexdigest()
+
+    @staticmethod
+    def _load_cached(session, keys) -> dict[str, dict[str, Any]]:
+        """Fetch cached annotations for the given keys in one query."""
+        rows = session.exec(
+            select(AnnotationCache).where(AnnotationCache.desc_hash.in_(list(keys)))
+        ).all()
+        return {
+            row.desc_hash: {field: getattr(row, field) for field in ANNOTATION_FIELDS}
+            for row in rows
+        }
+
+    @staticmethod
+    def _store_cached(session, annotations_by_key: dict[str, dict[str, Any]]) -> None:
+        """Remember annotations; keys cached meanwhile by another run are left alone."""
+        if not annotations_by_key:
+            return
+        stmt = insert(AnnotationCache.__table__).on_conflict_do_nothing(
+            index_elements=["desc_hash"]
+        )
+        session.connection().execute(
+            stmt,
+            [{"desc_hash": key, **values} for key, values in annotations_by_key.items()],
+        )
+
+    @staticmethod
+    def _build_messages(description: str) -> list[Any]:
+        """Build the chat messages asking the LLM to annotate one description."""
+        from langchain_core.messages import HumanMessage, SystemMessage
 
-        messages = [
-            SystemMessage(content=system_prompt),
+        return [
+            SystemMessage(content=SYSTEM_PROMPT),
             HumanMessage(content=f"Transaction: {description}"),
         ]
 
-        response = llm.invoke(messages)
-
-        # Parse JSON response
-        import json
-
+    @staticmethod
+    def _parse_response(content: str) -> Optional[dict[str, Any]]:
+        """Parse the LLM's JSON reply, or return None if it isn't valid JSON."""
         try:
-            result = json.loads(response.content)
-            return {
-                "description": result.get("description", ""),
-                "category": result.get("category", "Other"),
-                "originator_name": result.get("originator_name"),
-                "is_taxes": result.get("is_taxes", False),
-            }
+            result = json.loads(content)
         except json.JSONDecodeError:
-            return {
-                "description": description,
-                "category": "Other",
-                "originator_name": None,
-                "is_taxes": False,
-            }
+            return None
+        return {
+            "description": result.get("description", ""),
+            "category": result.get("category", "Other"),
+            "originator_name": result.get("originator_name"),
+            "is_taxes": result.get("is_taxes", False),
+        }
+
+    @staticmethod
+    def _fallback_annotations(description: str) -> dict[str, Any]:
+        """Neutral annotations for a reply that couldn't be parsed (never cached)."""
+        return {
+            "description": description,
+            "category": "Other",
+            "originator_name": None,
+            "is_taxes": False,
+        }
 
     def annotate_batch(self, transaction_ids: list[int], batch_size: int = 10) -> int:
         """
         Annotate multiple transactions in batches.
 
+        Transactions whose description is already in the annotation cache are
+        filled in directly. The rest are grouped by description so each distinct
+        one costs a single LLM call; batches of batch_size calls run concurrently
+        and are committed together.
+
         Returns number of transactions annotated
         """
         annotated = 0
 
         with get_session() as session:
-            for txn_id in transaction_ids:
-                transaction = session.get(Transaction, txn_id)
-                if not transaction:
-                    continue
+            # Load targets with one IN query per chunk rather than a get() per id;
+            # chunking keeps each query under SQLite's bound-parameter limit
+            for start in range(0, len(transaction_ids), self.LOAD_CHUNK_SIZE):
+                chunk = transaction_ids[start : start + self.LOAD_CHUNK_SIZE]
+                transactions = session.exec(
+                    select(Transaction).where(Transaction.id.in_(chunk))
+                ).all()
 
                 # Skip already annotated transactions
-                if transaction.description and transaction.category:
+                pending_by_key: dict[str, list[Transaction]] = defaultdict(list)
+                for transaction in transactions:
+                    if not (transaction.description and transaction.category):
+                        key = self._cache_key(transaction.bank_statement_description)
+                        pending_by_key[key].append(transaction)
+                if not pending_by_key:
                     continue
 
-                try:
-                    annotations = self.annotate_transaction(
-                        transaction.bank_statement_description
+                cached = self._load_cached(session, pending_by_key)
+                for key, annotations in cached.items():
+                    annotated += self._apply(session, pending_by_key.pop(key), annotations)
+                session.commit()
+
+                misses = list(pending_by_key)
+                for batch_start in range(0, len(misses), batch_size):
+                    keys = misses[batch_start : batch_start + batch_size]
+                    # Requests are I/O bound, so the whole batch runs in parallel;
+                    # a failed request comes back as its exception
+                    responses = self._get_llm().batch(
+                        [
+                            self._build_messages(
+                                pending_by_key[key][0].bank_statement_description
+                            )
+                            for key in keys
+                        ],
+                        config={"max_concurrency": batch_size},
+                        return_exceptions=True,
                     )
 
-                    # Update transaction
-                    for key, value in annotations.items():
-                        if hasattr(transaction, key):
-                            setattr(transaction, key, value)
-
-                    session.add(transaction)
-                    annotated += 1
+                    fresh = {}
+                    for key, response in zip(keys, responses):
+                        group = pending_by_key[key]
+                        if isinstance(response, Exception):
+                            logger.warning(
+                                "Error annotating transaction %s: %s",
+                                group[0].id,
+                                response,
+                            )
+                            continue
+
+                        annotations = self._parse_response(response.content)
+                        if annotations is None:
+                            # The fallback keeps each row's own text, which only
+                            # matches its key up to digits
+                            for transaction in group:
+                                annotated += self._apply(
+                                    session,
+                                    [transaction],
+                                    self._fallback_annotations(
+                                        transaction.bank_statement_description
+                                    ),
+                                )
+                            continue
+
+                        fresh[key] = annotations
+                        annotated += self._apply(session, group, annotations)
 
                     # Commit in batches
-                    if annotated % batch_size == 0:
-                        session.commit()
-
-                except Exception as e:
-                    print(f"Error annotating transaction {txn_id}: {e}")
-                    continue
-
-            # Final commit
-            session.commit()
+                    self._store_cached(session, fresh)
+                    session.commit()
 
+        if annotated:
+            self.transaction_service.mark_changed()
         return annotated
 
+    @staticmethod
+    def _apply(session, transactions: list[Transaction], annotations: dict[str, Any]) -> int:
+        """Copy annotations onto transactions and return how many were updated."""
+        for transaction in transactions:
+            for key, value in annotations.items():
+                if hasattr(transaction, key):
+                    setattr(transaction, key, value)
+            session.add(transaction)
+        return len(transactions)
+
     def annotate_all_unannotated(self, batch_size: int = 10) -> int:
         """Annotate all transactions that haven't been annotated yet."""
         with get_session() as session:
@@ -37,20 +37,34 @@ class TransactionPipeline:
             self._transaction_service = TransactionService()
         return self._transaction_service
 
+    def warmup(self) -> None:
+        """Create the services and open a pooled DB connection before the first import."""
+        from src.database import engine
+
+        self.extraction_service
+        self.transaction_service
+        with engine.connect() as connection:
+            connection.exec_driver_sql("SELECT 1")
+
     def process(self, csv_path: str, annotate: bool = False) -> dict[str, Any]:
         """
         Run the full pipeline: extract -> (optionally annotate) -> insert.
 
         Returns dict with counts of operations performed.
         """
-        # Extract transactions from CSV
-        transactions = self.extraction_service.extract(csv_path)
+        extracted = 0
+
+        def transactions():
+            nonlocal extracted
+            for transaction in self.extraction_service.extract_iter(csv_path):
+                extracted += 1
+                yield transaction
 
-        # Insert into database
-        inserted = self.transaction_service.insert_transactions(transactions)
+        # Rows stream from the CSV into chunked inserts without building a list
+        inserted = self.transaction_service.insert_transactions(transactions())
 
         result = {
-            "extracted": len(transactions),
+            "extracted": extracted,
             "inserted": inserted,
             "annotated": 0,
         }
@@ -1,10 +1,52 @@
 """Service for processing bank statement CSV files."""
 
 import csv
+import math
 import re
 from collections import defaultdict
 from datetime import datetime
-from typing import Any, Optional
+from functools import lru_cache
+from typing import Any, Iterator, Optional
+
+# Month abbreviations used by the statement's "%d %b %Y" dates
+_MONTHS = {
+    "Jan": 1,
+    "Feb": 2,
+    "Mar": 3,
+    "Apr": 4,
+    "May": 5,
+    "Jun": 6,
+    "Jul": 7,
+    "Aug": 8,
+    "Sep": 9,
+    "Oct": 10,
+    "Nov": 11,
+    "Dec": 12,
+}
+
+
+@lru_cache(maxsize=4096)
+def _parse_date(value: str) -> datetime:
+    """Parse a statement date; a statement only has a few dozen distinct ones."""
+    parts = value.split(" ")
+    if len(parts) == 3:
+        day, month, year = parts
+        # Only the plain "1 Jan 2025" / "01 Jan 2025" shape, which strptime
+        # would also accept; everything else is left to strptime
+        if (
+            value.isascii()
+            and day.isdigit()
+            and len(day) <= 2
+            and year.isdigit()
+            and len(year) == 4
+            and month.title() in _MONTHS
+        ):
+            try:
+                return datetime(int(year), _MONTHS[month.title()], int(day))
+            except ValueError:
+                pass
+    # Anything unusual goes through strptime, which raises ValueError if invalid
+    return datetime.strptime(value, BankStatementProcessingService.DATE_FORMAT)
 
 
 class BankStatementProcessingService:
@@ -13,6 +55,13 @@ class BankStatementProcessingService:
     # Known date formats in the CSV
     DATE_FORMAT = "%d %b %Y"
 
+    # Patterns applied to every row, compiled once
+    _STAN_RE = re.compile(r"STAN\s*\((\d+)\)", re.IGNORECASE)
+    _TAX_RE = re.compile(
+        r"FBRTax|Withholding Tax|Charges Taxes|CHG:.*Tax", re.IGNORECASE
+    )
+    _AMOUNT_CLEAN_RE = re.compile(r"[^\d.-]")
+
     def __init__(self):
         """Initialize the service."""
         # Lazy import to avoid circular dependency
@@ -36,41 +85,49 @@ class BankStatementProcessingService:
         Returns:
             List of transaction dictionaries
         """
-        transactions = []
-        day_counts: dict[str, int] = defaultdict(int)
-
-        with open(csv_path, "r", encoding="utf-8-sig") as f:
-            reader = csv.reader(f)
-            rows = list(reader)
+        return list(self.extract_iter(csv_path))
 
-        # Find the header row (contains "Booking Date")
-        header_idx = None
-        for i, row in enumerate(rows):
-            if row and "Booking Date" in row[0]:
-                header_idx = i
-                break
-
-        if header_idx is None:
-            raise ValueError("Could not find header row in CSV")
+    def extract_iter(self, csv_path: str) -> Iterator[dict[str, Any]]:
+        """
+        Yield transactions from a CSV file as they are parsed.
 
-        # Parse transactions after header
-        for row in rows[header_idx + 1 :]:
-            # Skip empty rows or summary rows
-            if not row or not row[0] or row[0].strip() == "":
-                continue
+        Raises ValueError once the file is exhausted if it had no header row.
+        """
+        day_counts: dict[datetime, int] = defaultdict(int)
 
-            try:
-                transaction = self._parse_row(row, day_counts)
+        # newline="" hands line endings to the csv module (as it expects), and a
+        # large buffer lets it read the statement in a few big chunks
+        with open(
+            csv_path, "r", encoding="utf-8-sig", newline="", buffering=1 << 20
+        ) as f:
+            reader = csv.reader(f)
+            header_seen = False
+
+            # Single pass: skip the preamble until the header row (contains
+            # "Booking Date"), then parse rows as they are read
+            for row in reader:
+                if not header_seen:
+                    if row and "Booking Date" in row[0]:
+                        header_seen = True
+                    continue
+
+                # Skip empty rows or summary rows
+                if not row or not row[0] or row[0].strip() == "":
+                    continue
+
+                try:
+                    transaction = self._parse_row(row, day_counts)
+                except (ValueError, IndexError):
+                    # Skip malformed rows
+                    continue
                 if transaction:
-                    transactions.append(transaction)
-            except (ValueError, IndexError):
-                # Skip malformed rows
-                continue
+                    yield transaction
 
-        return transactions
+        if not header_seen:
+            raise ValueError("Could not find header row in CSV")
 
     def _parse_row(
-        self, row: list[str], day_counts: dict[str, int]
+        self, row: list[str], day_counts: dict[datetime, int]
     ) -> Optional[dict[str, Any]]:
         """Parse a single CSV row into a transaction dict."""
         booking_date_str = row[0].strip()
@@ -81,13 +138,12 @@ class BankStatementProcessingService:
             return None
 
         # Parse dates
-        booking_date = datetime.strptime(booking_date_str, self.DATE_FORMAT)
-        value_date = datetime.strptime(value_date_str, self.DATE_FORMAT)
+        booking_date = _parse_date(booking_date_str)
+        value_date = _parse_date(value_date_str)
 
-        # Get day key for ordering
-        day_key = booking_date.strftime("%Y-%m-%d")
-        day_counts[day_key] += 1
-        day_order_id = day_counts[day_key]
+        # Booking dates carry no time, so the datetime itself keys the day
+        day_counts[booking_date] += 1
+        day_order_id = day_counts[booking_date]
 
         # Parse description and extract STAN ID
         description = row[3].strip() if len(row) > 3 else ""
@@ -116,29 +172,32 @@ class BankStatementProcessingService:
     def _extract_stan_id(self, description: str) -> Optional[str]:
         """Extract STAN ID from description."""
         # Pattern: STAN (123456) or STAN(123456)
-        match = re.search(r"STAN\s*\((\d+)\)", description, re.IGNORECASE)
+        match = self._STAN_RE.search(description)
         return match.group(1) if match else None
 
     def _is_tax_transaction(self, description: str) -> bool:
         """Check if transaction is a tax-related entry."""
-        tax_patterns = [
-            r"FBRTax",
-            r"Withholding Tax",
-            r"Charges Taxes",
-            r"CHG:.*Tax",
-        ]
-        for pattern in tax_patterns:
-            if re.search(pattern, description, re.IGNORECASE):
-                return True
-        return False
+        return self._TAX_RE.search(description) is not None
 
     def _parse_amount(self, value: str) -> Optional[float]:
         """Parse amount string to float."""
-        if not value or not value.strip():
+        if not value:
             return None
+        value = value.strip()
+        if not value:
+            return None
+        # Plain numbers (once thousands separators are dropped) need no regex;
+        # float() also takes "inf"/"nan", which aren't amounts, so only finite
+        # results are accepted here
+        try:
+            amount = float(value.replace(",", ""))
+            if math.isfinite(amount):
+                return amount
+        except ValueError:
+            pass
         try:
             # Remove any currency symbols and commas
-            cleaned = re.sub(r"[^\d.-]", "", value.strip())
+            cleaned = self._AMOUNT_CLEAN_RE.sub("", value)
             return float(cleaned) if cleaned else None
         except ValueError:
             return None
@@ -150,5 +209,4 @@ class BankStatementProcessingService:
         Returns:
             Number of new transactions inserted
         """
-        transactions = self.extract(csv_path)
-        return self.transaction_service.insert_transactions(transactions)
+        return self.transaction_service.insert_transactions(self.extract_iter(csv_path))
@@ -1,9 +1,12 @@
 """Service for managing transactions in the database."""
 
+from collections import defaultdict
 from datetime import datetime
-from typing import Any, Optional
+from itertools import islice
+from typing import Any, Iterable, Optional
 
-from sqlmodel import and_, select
+from sqlalchemy.dialects.sqlite import insert
+from sqlmodel import and_, delete, func, literal, or_, select, tuple_, update
 
 from src.config import settings
 from src.database import get_session
@@ -13,6 +16,33 @@ from src.models import Transaction
 class TransactionService:
     """Service for managing transactions in the database."""
 
+    # Shared by all instances; bumped on every write so cached reads can be invalidated
+    _data_version: int = 0
+
+    # (data version, categories) from the last get_all_categories call
+    _categories_cache: Optional[tuple[int, list[str]]] = None
+
+    # Fields returned by read_transactions(projection="ui"), as shown in the table
+    UI_FIELDS = (
+        "id",
+        "booking_date_time",
+        "description",
+        "originator_name",
+        "debit",
+        "credit",
+        "category",
+    )
+
+    @property
+    def data_version(self) -> int:
+        """Get the current data version."""
+        return TransactionService._data_version
+
+    @staticmethod
+    def mark_changed() -> None:
+        """Bump the data version after transactions were written."""
+        TransactionService._data_version += 1
+
     def read_transactions(
         self,
         page: int = 1,
@@ -25,93 +55,149 @@ class TransactionService:
         transaction_id: Optional[int] = None,
         include_taxes_nested: bool = True,
         only_annotated: bool = False,
+        sort_by: Optional[str] = None,
+        descending: bool = True,
+        date_as_str: bool = False,
+        include_total: bool = True,
+        after: Optional[tuple] = None,
+        projection: Optional[str] = None,
     ) -> dict[str, Any]:
         """
         Read transactions with filtering, sorting, and pagination.
 
+        Results are sorted by sort_by (a Transaction column name) when given,
+        then by date and day_order_id. With date_as_str, booking_date_time is
+        returned as a 'YYYY-MM-DD' string formatted by SQLite. Callers that
+        already know the total can pass include_total=False to skip the count
+        query; 'total' and 'total_pages' are then None.
+
+        Pass the previous page's 'next_cursor' as after (with the same sorting)
+        to seek straight to the next page instead of skipping rows with OFFSET.
+
+        With projection="ui" only UI_FIELDS are selected (dates as strings, no
+        related taxes); use get_transaction for the full row.
+
         Returns:
-            Dict with 'transactions', 'total', 'page', 'page_size', 'total_pages'
+            Dict with 'transactions', 'total', 'page', 'page_size', 'total_pages',
+            'next_cursor'
         """
         if page_size is None:
             page_size = settings.default_page_size
 
         with get_session() as session:
-            # Build base query - exclude tax transactions if nesting
-            query = select(Transaction)
-
-            if include_taxes_nested:
-                query = query.where(Transaction.is_taxes == False)
-
-            # Apply filters
-            if start_date:
-                query = query.where(Transaction.booking_date_time >= start_date)
-            if end_date:
-                query = query.where(Transaction.booking_date_time <= end_date)
-            if category:
-                query = query.where(Transaction.category == category)
-            if custom_name:
-                query = query.where(Transaction.description.ilike(f"%{custom_name}%"))
-            if name:
-                query = query.where(Transaction.originator_name.ilike(f"%{name}%"))
-            if transaction_id:
-                query = query.where(Transaction.id == transaction_id)
-            if only_annotated:
-                query = query.where(Transaction.description.isnot(None))
-                query = query.where(Transaction.category.isnot(None))
+            # Build base query
+            booking_date = func.strftime("%Y-%m-%d", Transaction.booking_date_time)
+            # Sort by the requested column, then by date, day_order_id and id
+            order_columns = [
+                Transaction.booking_date_time,
+                Transaction.day_order_id,
+                Transaction.id,
+            ]
+            if sort_by and sort_by != "booking_date_time":
+                if sort_by not in Transaction.__table__.columns:
+                    raise ValueError(f"Cannot sort by unknown column: {sort_by}")
+                order_columns.insert(0, getattr(Transaction, sort_by))
+
+            if projection == "ui":
+                # The trailing sort columns only feed next_cursor
+                query = select(
+                    Transaction.id,
+                    booking_date,
+                    Transaction.description,
+                    Transaction.originator_name,
+                    Transaction.debit,
+                    Transaction.credit,
+                    Transaction.category,
+                    *order_columns,
+                )
+            elif projection is None:
+                # Plain column rows skip building a Transaction model per row
+                columns = list(Transaction.__table__.columns)
+                if date_as_str:
+                    columns.append(booking_date.label("booking_date_str"))
+                query = select(*columns)
+            else:
+                raise ValueError(f"Unknown projection: {projection}")
+
+            # Page and count share one filter list so they can't drift apart
+            conditions = self._filter_conditions(
+                start_date=start_date,
+                end_date=end_date,
+                category=category,
+                custom_name=custom_name,
+                name=name,
+                transaction_id=transaction_id,
+                exclude_taxes=include_taxes_nested,
+                only_annotated=only_annotated,
+            )
+            query = query.where(*conditions)
 
             # Get total count
-            count_query = select(Transaction)
-            if include_taxes_nested:
-                count_query = count_query.where(Transaction.is_taxes == False)
-            if start_date:
-                count_query = count_query.where(
-                    Transaction.booking_date_time >= start_date
-                )
-            if end_date:
-                count_query = count_query.where(
-                    Transaction.booking_date_time <= end_date
+            total = None
+            if include_total:
+                count_query = (
+                    select(func.count()).select_from(Transaction).where(*conditions)
                 )
-            if category:
-                count_query = count_query.where(Transaction.category == category)
-            if only_annotated:
-                count_query = count_query.where(Transaction.description.isnot(None))
-                count_query = count_query.where(Transaction.category.isnot(None))
+                total = session.exec(count_query).one()
 
-            all_for_count = session.exec(count_query).all()
-            total = len(all_for_count)
-
-            # Sort by date and day_order_id
             query = query.order_by(
-                Transaction.booking_date_time.desc(), Transaction.day_order_id.desc()
+                *(c.desc() if descending else c.asc() for c in order_columns)
             )
 
-            # Apply pagination
-            offset = (page - 1) * page_size
-            query = query.offset(offset).limit(page_size)
+            # Apply pagination, seeking past the cursor when one is given
+            if after is not None:
+                if len(after) != len(order_columns):
+                    raise ValueError("Cursor does not match the sort order")
+                query = query.where(self._seek_condition(order_columns, after, descending))
+            else:
+                query = query.offset((page - 1) * page_size)
+            query = query.limit(page_size)
 
             transactions = session.exec(query).all()
 
-            # Convert to dicts and nest taxes
-            result = []
-            for txn in transactions:
-                txn_dict = txn.model_dump()
-
-                if include_taxes_nested and txn.stan_id:
-                    # Find related tax transactions
-                    tax_query = select(Transaction).where(
-                        and_(
-                            Transaction.is_taxes == True,
-                            Transaction.stan_id == txn.stan_id,
+            next_cursor = None
+            if len(transactions) == page_size:
+                last = transactions[-1]
+                if projection == "ui":
+                    next_cursor = tuple(last[-len(order_columns) :])
+                else:
+                    next_cursor = tuple(getattr(last, c.key) for c in order_columns)
+
+            if projection == "ui":
+                result = [dict(zip(self.UI_FIELDS, row)) for row in transactions]
+            else:
+                # Find related tax transactions for the whole page in one query
+                taxes_by_stan: dict[str, list[dict[str, Any]]] = defaultdict(list)
+                stan_ids = {row.stan_id for row in transactions if row.stan_id}
+                if include_taxes_nested and stan_ids:
+                    # Plain column rows: the taxes are only turned into dicts
+                    tax_query = (
+                        select(*Transaction.__table__.columns)
+                        .where(
+                            and_(
+                                Transaction.is_taxes == True,
+                                Transaction.stan_id.in_(stan_ids),
+                            )
                         )
+                        .order_by(Transaction.id)
                     )
-                    taxes = session.exec(tax_query).all()
-                    txn_dict["related_taxes"] = [t.model_dump() for t in taxes]
-                else:
-                    txn_dict["related_taxes"] = []
+                    for tax in session.exec(tax_query):
+                        taxes_by_stan[tax.stan_id].append(tax._asdict())
+
+                # Convert to dicts and nest taxes
+                result = []
+                for row in transactions:
+                    txn_dict = row._asdict()
+                    if date_as_str:
+                        txn_dict["booking_date_time"] = txn_dict.pop("booking_date_str")
 
-                result.append(txn_dict)
+                    txn_dict["related_taxes"] = taxes_by_stan.get(txn_dict["stan_id"], [])
 
-            total_pages = (total + page_size - 1) // page_size if total > 0 else 1
+                    result.append(txn_dict)
+
+            total_pages = None
+            if total is not None:
+                total_pages = (total + page_size - 1) // page_size if total > 0 else 1
 
             return {
                 "transactions": result,
@@ -119,39 +205,104 @@ class TransactionService:
                 "page": page,
                 "page_size": page_size,
                 "total_pages": total_pages,
+                "next_cursor": next_cursor,
             }
 
-    def insert_transactions(self, transactions: list[dict[str, Any]]) -> int:
+    @staticmethod
+    def _seek_condition(order_columns: list[Any], after: tuple, descending: bool) -> Any:
+        """Build the WHERE condition for rows that sort after the cursor."""
+        # Date, day_order_id and id are never NULL, so they compare as a row value
+        key = tuple_(*order_columns[-3:])
+        key_after = tuple(after[-3:])
+        past_key = key < key_after if descending else key > key_after
+        if len(order_columns) == 3:
+            return past_key
+
+        # A sort column may hold NULLs, which SQLite orders below every value
+        # (last when descending, first when ascending)
+        column, value = order_columns[0], after[0]
+        if value is None:
+            if descending:
+                return and_(column.is_(None), past_key)
+            return or_(column.isnot(None), past_key)
+        # Bound explicitly so booleans compare like any other value
+        value = literal(value, column.type)
+        if descending:
+            beyond = or_(column < value, column.is_(None))
+        else:
+            beyond = column > value
+        return or_(beyond, and_(column == value, past_key))
+
+    @staticmethod
+    def _filter_conditions(
+        start_date: Optional[datetime],
+        end_date: Optional[datetime],
+        category: Optional[str],
+        custom_name: Optional[str],
+        name: Optional[str],
+        transaction_id: Optional[int],
+        exclude_taxes: bool,
+        only_annotated: bool,
+    ) -> list[Any]:
+        """Build the WHERE conditions for read_transactions' filters."""
+        conditions = []
+        # Tax transactions are nested under their parent instead of listed
+        if exclude_taxes:
+            conditions.append(Transaction.is_taxes == False)
+        if start_date:
+            conditions.append(Transaction.booking_date_time >= start_date)
+        if end_date:
+            conditions.append(Transaction.booking_date_time <= end_date)
+        if category:
+            conditions.append(Transaction.category == category)
+        if custom_name:
+            conditions.append(Transaction.description.ilike(f"%{custom_name}%"))
+        if name:
+            conditions.append(Transaction.originator_name.ilike(f"%{name}%"))
+        if transaction_id:
+            conditions.append(Transaction.id == transaction_id)
+        if only_annotated:
+            conditions.append(Transaction.description.isnot(None))
+            conditions.append(Transaction.category.isnot(None))
+        return conditions
+
+    def get_transaction(self, transaction_id: int) -> Optional[dict[str, Any]]:
+        """Get a single transaction by ID, or None if not found."""
+        with get_session() as session:
+            transaction = session.get(Transaction, transaction_id)
+            return transaction.model_dump() if transaction else None
+
+    def insert_transactions(
+        self, transactions: Iterable[dict[str, Any]], chunk_size: int = 500
+    ) -> int:
         """
         Insert transactions using composite unique key check.
 
         Only inserts transactions that don't already exist (by booking_date_time + day_order_id).
+        Rows are written with one executemany per chunk_size rows, all in a
+        single transaction. transactions may be a generator; it is consumed
+        chunk by chunk, so only chunk_size rows are held at a time.
 
         Returns:
             Number of new transactions inserted
         """
         inserted = 0
+        # The unique (booking_date_time, day_order_id) index lets SQLite skip rows
+        # that are already stored, including repeats within this batch
+        statement = insert(Transaction.__table__).on_conflict_do_nothing(
+            index_elements=["booking_date_time", "day_order_id"]
+        )
 
         with get_session() as session:
-            for txn_data in transactions:
-                # Check if transaction already exists
-                existing = session.exec(
-                    select(Transaction).where(
-                        and_(
-                            Transaction.booking_date_time
-                            == txn_data["booking_date_time"],
-                            Transaction.day_order_id == txn_data["day_order_id"],
-                        )
-                    )
-                ).first()
-
-                if not existing:
-                    transaction = Transaction(**txn_data)
-                    session.add(transaction)
-                    inserted += 1
+            connection = session.connection()
+            rows = iter(transactions)
+            while chunk := list(islice(rows, chunk_size)):
+                inserted += connection.execute(statement, chunk).rowcount
 
             session.commit()
 
+        if inserted:
+            self.mark_changed()
         return inserted
 
     def update_transaction_by_id(
@@ -174,6 +325,7 @@ class TransactionService:
 
             session.add(transaction)
             session.commit()
+            self.mark_changed()
             return True
 
     def update_transactions_bulk(
@@ -185,21 +337,26 @@ class TransactionService:
         Returns:
             Number of transactions updated
         """
-        updated = 0
+        # Unknown keys are ignored, as for single updates
+        columns = Transaction.__table__.columns
+        values = {key: value for key, value in updates.items() if key in columns}
 
         with get_session() as session:
-            for txn_id in transaction_ids:
-                transaction = session.get(Transaction, txn_id)
-                if transaction:
-                    for key, value in updates.items():
-                        if hasattr(transaction, key):
-                            setattr(transaction, key, value)
-                    session.add(transaction)
-                    updated += 1
-
+            if not values:
+                return session.exec(
+                    select(func.count()).where(Transaction.id.in_(transaction_ids))
+                ).one()
+
+            result = session.execute(
+                update(Transaction.__table__)
+                .where(Transaction.id.in_(transaction_ids))
+                .values(**values)
+            )
             session.commit()
 
-        return updated
+        if result.rowcount:
+            self.mark_changed()
+        return result.rowcount
 
     def delete_transaction(self, transaction_id: int) -> bool:
         """
@@ -215,12 +372,41 @@ class TransactionService:
 
             session.delete(transaction)
             session.commit()
+            self.mark_changed()
             return True
 
+    def delete_transactions_bulk(self, transaction_ids: list[int]) -> int:
+        """
+        Delete multiple transactions in a single statement.
+
+        Returns:
+            Number of transactions deleted
+        """
+        if not transaction_ids:
+            return 0
+
+        with get_session() as session:
+            result = session.execute(
+                delete(Transaction).where(Transaction.id.in_(transaction_ids))
+            )
+            session.commit()
+
+        if result.rowcount:
+            self.mark_changed()
+        return result.rowcount
+
     def get_all_categories(self) -> list[str]:
-        """Get all unique categories."""
+        """Get all unique categories, cached until the data version changes."""
+        version = TransactionService._data_version
+        cached = TransactionService._categories_cache
+        if cached and cached[0] == version:
+            return list(cached[1])
+
         with get_session() as session:
             query = select(Transaction.category).where(
                 Transaction.category.isnot(None)
             ).distinct()
-            return [c for c in session.exec(query).all() if c]
+            categories = [c for c in session.exec(query).all() if c]
+
+        TransactionService._categories_cache = (version, categories)
+        return list(categories)